@@ -19,11 +19,13 @@ Version: 4.0 - Marketplace Edition
 # ============================================================================
 # IMPORTS
 # ============================================================================
+import html
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, timedelta
+from types import MappingProxyType
+from streamlit.errors import StreamlitAPIException
 from supabase import create_client, Client
 
 # ============================================================================
@@ -60,25 +62,110 @@ st.markdown("""
     .stTabs [data-baseweb="tab"] {
         padding: 10px 20px;
     }
-    .provider-badge {
-        display: inline-block;
-        padding: 5px 10px;
-        border-radius: 15px;
-        font-size: 12px;
-        font-weight: bold;
-        margin: 5px 0;
+    .st-key-card_urgent {
+        background-color: #ffebee;
+        border-left: 5px solid #f44336;
     }
-    .doctor-badge {
-        background-color: #e3f2fd;
-        color: #1976d2;
+    .st-key-card_moderate {
+        background-color: #fff9e6;
+        border-left: 5px solid #ff9800;
     }
-    .pharmacist-badge {
-        background-color: #f3e5f5;
-        color: #7b1fa2;
+    .st-key-card_low {
+        background-color: #e8f5e9;
+        border-left: 5px solid #4caf50;
     }
     </style>
 """, unsafe_allow_html=True)
 
+# ============================================================================
+# QUEUE STYLING
+# ============================================================================
+_PRIORITY_ICON = {
+    'URGENT': '🔴',
+    'MODERATE': '🟡',
+    'LOW': '🟢'
+}
+
+_PRIORITY_BG = {
+    'URGENT': 'background-color: #ffebee;',
+    'MODERATE': 'background-color: #fff9e6;',
+    'LOW': 'background-color: #e8f5e9;'
+}
+
+_PRIORITY_RANK = {
+    'URGENT': 0,
+    'MODERATE': 1,
+    'LOW': 2
+}
+
+_PRIORITY_BORDER = {
+    'URGENT': '#f44336',
+    'MODERATE': '#ff9800',
+    'LOW': '#4caf50'
+}
+
+_PROVIDER_BADGE = {
+    'doctor': ":blue-background[👨‍⚕️ **DOCTOR**]",
+    'pharmacist': ":violet-background[💊 **PHARMACIST**]"
+}
+_UNASSIGNED_BADGE = ":red-background[⚠️ **UNASSIGNED**]"
+
+# Fixed fields written when a session is assigned; read-only so handlers
+# can only merge them into a fresh update dict
+_DOCTOR_ASSIGNMENT = MappingProxyType({
+    'provider_type': 'doctor',
+    'status': 'assigned',
+    'consultation_fee': 1500
+})
+
+_PHARMACIST_ASSIGNMENT = MappingProxyType({
+    'provider_type': 'pharmacist',
+    'status': 'assigned',
+    'consultation_fee': 1000
+})
+
+_AGREEMENT_MAP = MappingProxyType({
+    'Agree with AI': 'agreed',
+    'Partially agree': 'modified',
+    'Disagree with AI': 'disagreed'
+})
+
+# Consultation field -> queue table header
+_QUEUE_COLUMNS = {
+    'patient_name': 'Patient',
+    'priority': 'Priority',
+    'status': 'Status',
+    'provider_type': 'Provider',
+    'severity': 'Severity',
+    'created_at': 'Received'
+}
+
+_QUEUE_PAGE_SIZE = 10
+
+def _set_queue_page(page):
+    """Button callback for the live queue Prev/Next controls"""
+    st.session_state.queue_page = page
+
+# ============================================================================
+# DISPLAY HELPERS
+# ============================================================================
+def _tint_rows(df, column, colors):
+    """Styler.apply(axis=None) helper: tint every row by the value in `column`
+    in one vectorized pass"""
+    if column not in df.columns:
+        return pd.DataFrame('', index=df.index, columns=df.columns)
+    row_bg = df[column].astype(object).map(colors).fillna('').to_numpy()
+    return pd.DataFrame(np.repeat(row_bg[:, None], df.shape[1], axis=1),
+                        index=df.index, columns=df.columns)
+
+def _rerun_fragment():
+    """Rerun only the calling fragment; fall back to a full rerun when the
+    click was processed as part of a full-script run"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
 # ============================================================================
 # SUPABASE CONNECTION
 # ============================================================================
@@ -125,38 +212,69 @@ def get_all_consultations():
         st.error(f"Error fetching all consultations: {str(e)}")
         return []
 
-def get_doctors():
-    """Fetch all doctors from database"""
+# Provider rosters and inventory change rarely, so share them across reruns
+# and sessions for a minute instead of re-querying on every widget click.
+# The cached _fetch_* functions let errors propagate so a failed query is
+# never memoized; the get_* wrappers report it and fall back to an empty list.
+# Provider presence (is_online) is toggled from the provider dashboards, which
+# can't clear this cache, so views that act on it pass live=True.
+def _query_doctors():
+    """Query all doctors, newest first; raises on failure"""
+    response = (supabase.table('doctors')
+        .select('*')
+        .order('created_at', desc=True)
+        .execute())
+    return response.data if response.data else []
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_doctors():
+    """Cached doctors roster; raises on failure so errors are never cached"""
+    return _query_doctors()
+
+def get_doctors(live=False):
+    """Fetch all doctors from database; live=True skips the cache so
+    is_online is current"""
     try:
-        response = (supabase.table('doctors')
-            .select('*')
-            .order('created_at', desc=True)
-            .execute())
-        return response.data if response.data else []
+        return _query_doctors() if live else _fetch_doctors()
     except Exception as e:
         st.error(f"Error fetching doctors: {str(e)}")
         return []
 
-def get_pharmacists():
-    """Fetch all pharmacists from database"""
+def _query_pharmacists():
+    """Query all pharmacists, newest first; raises on failure"""
+    response = (supabase.table('pharmacists')
+        .select('*')
+        .order('created_at', desc=True)
+        .execute())
+    return response.data if response.data else []
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_pharmacists():
+    """Cached pharmacists roster; raises on failure so errors are never cached"""
+    return _query_pharmacists()
+
+def get_pharmacists(live=False):
+    """Fetch all pharmacists from database; live=True skips the cache so
+    is_online is current"""
     try:
-        response = (supabase.table('pharmacists')
-            .select('*')
-            .order('created_at', desc=True)
-            .execute())
-        return response.data if response.data else []
+        return _query_pharmacists() if live else _fetch_pharmacists()
     except Exception as e:
         st.error(f"Error fetching pharmacists: {str(e)}")
         return []
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_pharmacies():
+    """Cached pharmacies list; raises on failure so errors are never cached"""
+    response = (supabase.table('pharmacies')
+        .select('*')
+        .order('created_at', desc=True)
+        .execute())
+    return response.data if response.data else []
+
 def get_pharmacies():
     """Fetch all pharmacies from database"""
     try:
-        response = (supabase.table('pharmacies')
-            .select('*')
-            .order('created_at', desc=True)
-            .execute())
-        return response.data if response.data else []
+        return _fetch_pharmacies()
     except Exception as e:
         st.error(f"Error fetching pharmacies: {str(e)}")
         return []
@@ -197,16 +315,27 @@ def get_payments():
         st.error(f"Error fetching payments: {str(e)}")
         return []
 
-def get_inventory():
-    """Fetch all medications from database"""
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_inventory_snapshot():
+    """Cached medications with their fetch time; raises on failure so errors
+    are never cached"""
+    response = (supabase.table('medications')
+        .select('*')
+        .execute())
+    return datetime.now().isoformat(), response.data if response.data else []
+
+def get_inventory_snapshot():
+    """Fetch all medications, stamped with the fetch time. The stamp only
+    changes when the cache refetches, so it serves as the inventory version."""
     try:
-        response = (supabase.table('medications')
-            .select('*')
-            .execute())
-        return response.data if response.data else []
+        return _fetch_inventory_snapshot()
     except Exception as e:
         st.error(f"Error fetching inventory: {str(e)}")
-        return []
+        return None, []
+
+def get_inventory():
+    """Fetch all medications from database"""
+    return get_inventory_snapshot()[1]
 
 def update_consultation_status(consultation_id, updates):
     """Update a consultation record"""
@@ -224,6 +353,7 @@ def add_doctor(doctor_data):
     """Add new doctor to database"""
     try:
         response = supabase.table('doctors').insert(doctor_data).execute()
+        _fetch_doctors.clear()
         return response.data
     except Exception as e:
         st.error(f"Error adding doctor: {str(e)}")
@@ -233,6 +363,7 @@ def add_pharmacist(pharmacist_data):
     """Add new pharmacist to database"""
     try:
         response = supabase.table('pharmacists').insert(pharmacist_data).execute()
+        _fetch_pharmacists.clear()
         return response.data
     except Exception as e:
         st.error(f"Error adding pharmacist: {str(e)}")
@@ -242,11 +373,220 @@ def add_pharmacy(pharmacy_data):
     """Add new pharmacy to database"""
     try:
         response = supabase.table('pharmacies').insert(pharmacy_data).execute()
+        _fetch_pharmacies.clear()
         return response.data
     except Exception as e:
         st.error(f"Error adding pharmacy: {str(e)}")
         return None
 
+# ============================================================================
+# CHART BUILDERS
+# ============================================================================
+# Figures are cached on their (small, pre-aggregated) inputs so reruns that
+# don't change the data reuse the built figure instead of rebuilding it.
+# max_entries bounds the store, since live data keeps producing new inputs.
+# Plotly is imported where it is used so pages without charts never load it.
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_daily_sessions_fig(daily_counts):
+    """Line chart of sessions per day"""
+    import plotly.express as px
+    fig = px.line(daily_counts, x='date', y='count',
+                 title='Daily Session Volume',
+                 labels={'date': 'Date', 'count': 'Sessions'})
+    fig.update_traces(line_color='#1f77b4', line_width=3)
+    return fig
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_counts_pie_fig(counts, title, color_map=None):
+    """Pie chart from a value_counts() series"""
+    import plotly.express as px
+    return px.pie(values=counts.values, names=counts.index,
+                 title=title,
+                 color_discrete_map=color_map)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_severity_fig(severity_counts):
+    """Bar chart of severity levels"""
+    import plotly.express as px
+    return px.bar(x=severity_counts.index, y=severity_counts.values,
+                 title='Severity Levels',
+                 labels={'x': 'Severity', 'y': 'Count'},
+                 color=severity_counts.values,
+                 color_continuous_scale='Reds')
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_provider_sessions_fig(provider_counts):
+    """Bar chart of sessions per provider type"""
+    import plotly.express as px
+    return px.bar(x=provider_counts.index, y=provider_counts.values,
+                 title='Sessions by Provider Type',
+                 labels={'x': 'Provider Type', 'y': 'Count'},
+                 color=provider_counts.index,
+                 color_discrete_map={'doctor': '#1976d2', 'pharmacist': '#7b1fa2'})
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_provider_response_fig(avg_by_provider):
+    """Bar chart of average response minutes per provider type"""
+    import plotly.express as px
+    return px.bar(avg_by_provider, x='provider_type', y='response_mins',
+                 title='Average Response Time by Provider Type',
+                 labels={'provider_type': 'Provider Type', 'response_mins': 'Minutes'},
+                 color='provider_type',
+                 color_discrete_map={'doctor': '#1976d2', 'pharmacist': '#7b1fa2'})
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_agreement_fig(agreed, modified, disagreed):
+    """Pie chart of provider vs AI assessment agreement"""
+    import plotly.express as px
+    agreement_data = pd.DataFrame({
+        'Category': ['Agreed', 'Modified', 'Disagreed'],
+        'Count': [agreed, modified, disagreed]
+    })
+    return px.pie(agreement_data, values='Count', names='Category',
+                 title='Provider-AI Assessment Agreement',
+                 color='Category',
+                 color_discrete_map={'Agreed': '#4caf50', 'Modified': '#ff9800', 'Disagreed': '#f44336'})
+
+# The inventory builders key on the snapshot version; the leading underscore
+# keeps Streamlit from hashing the frame itself on every call. Each refetch
+# mints a new version, so entries expire with the snapshot's 60s TTL.
+@st.cache_data(ttl=60, max_entries=4, show_spinner=False)
+def build_stock_levels_fig(_stock_levels, version, max_items=40):
+    """Current stock bars against the reorder-point line per medication;
+    large catalogs are cut down to the max_items with the lowest stock cover"""
+    import plotly.graph_objects as go
+    stock_levels = _stock_levels
+    title = 'Stock Levels vs Reorder Points'
+    
+    if len(stock_levels) > max_items:
+        reorder = stock_levels['reorder_point'].where(stock_levels['reorder_point'] > 0)
+        cover = (stock_levels['current_stock'] / reorder).fillna(np.inf)
+        stock_levels = stock_levels.loc[cover.nsmallest(max_items).index.sort_values()]
+        title = f'{title} ({max_items} lowest-cover items)'
+    
+    # Plain arrays go straight to Plotly's typed-array encoding instead of
+    # being converted Series by Series
+    meds = stock_levels['medication_name'].to_numpy()
+    cs = stock_levels['current_stock'].to_numpy()
+    rp = stock_levels['reorder_point'].to_numpy()
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Bar(
+        x=meds,
+        y=cs,
+        name='Current Stock',
+        marker_color='#1f77b4'
+    ))
+    
+    # WebGL line keeps the overlay cheap to draw as the catalog grows
+    fig.add_trace(go.Scattergl(
+        x=meds,
+        y=rp,
+        name='Reorder Point',
+        line=dict(color='#f44336', dash='dash'),
+        mode='lines+markers'
+    ))
+    
+    fig.update_layout(
+        title=title,
+        xaxis_title='Medication',
+        yaxis_title='Units',
+        height=400
+    )
+    return fig
+
+@st.cache_data(ttl=60, max_entries=4, show_spinner=False)
+def build_inventory_value_fig(_values, version, top_n=25):
+    """Bar chart of stock value per medication, largest first; anything past
+    the top_n items is folded into a single 'Other' bar"""
+    import plotly.express as px
+    ranked = _values.sort_values('total_value', ascending=False)
+    
+    if len(ranked) > top_n:
+        other = pd.DataFrame({'medication_name': ['Other'],
+                              'total_value': [ranked['total_value'].iloc[top_n:].sum()]})
+        ranked = pd.concat([ranked.head(top_n), other], ignore_index=True)
+    
+    return px.bar(ranked,
+                 x='medication_name', y='total_value',
+                 title='Inventory Value by Medication',
+                 labels={'total_value': 'Total Value (₦)', 'medication_name': 'Medication'},
+                 color='total_value',
+                 color_continuous_scale='Blues')
+
+# ============================================================================
+# ANALYTICS HELPERS
+# ============================================================================
+
+def _parse_utc(values):
+    """Parse ISO timestamps to UTC. The queue handlers (here and in the provider
+    dashboards) write offset-less server-local times, so those are localized
+    rather than read as UTC; values with an offset are converted directly."""
+    values = values.astype(str)
+    has_offset = values.str.contains(r':\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})$', regex=True)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    if has_offset.any():
+        parsed[has_offset] = pd.to_datetime(values[has_offset], format='ISO8601', utc=True)
+    if (~has_offset).any():
+        local_tz = datetime.now().astimezone().tzinfo
+        parsed[~has_offset] = (pd.to_datetime(values[~has_offset], format='ISO8601')
+                               .dt.tz_localize(local_tz).dt.tz_convert('UTC'))
+    return parsed
+
+# ============================================================================
+# INVENTORY HELPERS
+# ============================================================================
+
+# Medication field -> stock table header
+_STOCK_COLUMNS = {
+    'medication_name': 'Medication',
+    'current_stock': 'Current Stock',
+    'reorder_point': 'Reorder Point',
+    'stock_pct': 'Stock vs Reorder',
+    'monthly_demand': 'Monthly Demand',
+    'unit_price': 'Unit Price (₦)',
+    'status': 'Status'
+}
+
+_STOCK_BG = {
+    'Low Stock': 'background-color: #ffebee;',
+    'OK': 'background-color: #e8f5e9;'
+}
+
+@st.cache_data(ttl=60, max_entries=4, show_spinner=False)
+def _inv_summary(_inv, version):
+    """Scalars for the inventory summary cards, computed once per inventory version"""
+    inv = _inv
+    return {
+        'low': int((inv['status'] == 'Low Stock').sum()) if 'status' in inv.columns else 0,
+        'value': float(inv['total_value'].sum()) if 'total_value' in inv.columns else 0.0,
+        'avg': float(inv['monthly_demand'].mean()) if 'monthly_demand' in inv.columns else 0.0
+    }
+
+# ============================================================================
+# PROVIDER HELPERS
+# ============================================================================
+
+_ONLINE_BG = {
+    '🟢 ONLINE': 'background-color: #e8f5e9;',
+    '🔴 OFFLINE': 'background-color: #ffebee;'
+}
+
+def _provider_row(provider, license_field):
+    """One roster table row for a doctor or pharmacist record"""
+    return {
+        'Status': '🟢 ONLINE' if provider.get('is_online') else '🔴 OFFLINE',
+        'Name': provider['full_name'],
+        'Phone': provider.get('phone_number', 'N/A'),
+        'License': provider.get(license_field, 'N/A'),
+        'Verified': '✅ Verified' if provider.get('license_verified') else '⚠️ Pending',
+        'Consultations': provider.get('total_consultations', 0),
+        'Rating': f"{provider.get('rating', 0):.1f} ⭐",
+        'Total Earnings': f"₦{provider.get('total_earnings', 0):,.0f}"
+    }
+
 # ============================================================================
 # SIDEBAR NAVIGATION
 # ============================================================================
@@ -260,11 +600,12 @@ user_role = st.sidebar.selectbox(
     ["Admin (You)", "Blue Pill Pharmacy (Brother)"],
     help="Switch between admin view (all data) and pharmacy view (single pharmacy)"
 )
+is_admin = user_role == "Admin (You)"
 
 st.sidebar.markdown("---")
 
 # Admin sees all pages, pharmacy sees limited pages
-if user_role == "Admin (You)":
+if is_admin:
     page_options = [
         "📊 Live Queue",
         "👨‍⚕️ Doctors", 
@@ -293,7 +634,7 @@ page = st.sidebar.radio(
 st.sidebar.markdown("---")
 
 # Show different info based on role
-if user_role == "Admin (You)":
+if is_admin:
     st.sidebar.markdown("### 📊 Quick Stats")
     
     # Fetch quick stats
@@ -322,169 +663,201 @@ else:
 # PAGE 1: LIVE QUEUE
 # ============================================================================
 if page == "📊 Live Queue":
-    st.title("🔔 Live Patient Queue")
-    
-    # Fetch consultations
-    consultations = get_consultations()
-    
-    # Filter based on user role
-    if user_role != "Admin (You)":
-        # Show only consultations for this pharmacy
-        # For now, show all (in production, filter by pharmacy_id)
-        pass
-    
-    # ========================================================================
-    # TOP METRICS
-    # ========================================================================
-    col1, col2, col3, col4 = st.columns(4)
-    
-    urgent_count = sum(1 for p in consultations if p.get('priority') == 'URGENT')
-    
-    with col1:
-        st.metric(
-            "🚨 Urgent Cases", 
-            urgent_count,
-            delta="Needs attention" if urgent_count > 0 else None,
-            delta_color="inverse" if urgent_count > 0 else "off"
-        )
-    
-    with col2:
-        st.metric("👥 Total in Queue", len(consultations))
-    
-    with col3:
-        today = datetime.now().date()
-        today_count = sum(1 for p in consultations 
-                         if datetime.fromisoformat(p['created_at'].replace('Z', '+00:00')).date() == today)
-        st.metric("📅 Today's Sessions", today_count)
-    
-    with col4:
-        avg_wait = "5-10 min" if urgent_count > 0 else "15-20 min"
-        st.metric("⏱️ Avg Response Time", avg_wait)
-    
-    st.markdown("---")
-    
-    # ========================================================================
-    # FILTERS (Admin only)
-    # ========================================================================
-    if user_role == "Admin (You)":
-        col1, col2, col3 = st.columns(3)
+    # Fragment: queue widgets rerun only this page, not the sidebar stats
+    @st.fragment
+    def _live_queue():
+        st.title("🔔 Live Patient Queue")
+        
+        # Fetch consultations
+        consultations = get_consultations()
+        
+        # Filter based on user role
+        if not is_admin:
+            # Show only consultations for this pharmacy
+            # For now, show all (in production, filter by pharmacy_id)
+            pass
+        
+        # ========================================================================
+        # TOP METRICS
+        # ========================================================================
+        col1, col2, col3, col4 = st.columns(4)
+        
+        urgent_count = sum(1 for p in consultations if p.get('priority') == 'URGENT')
         
         with col1:
-            filter_provider = st.selectbox(
-                "Filter by Provider Type:",
-                ["All", "Doctor", "Pharmacist", "Unassigned"]
+            st.metric(
+                "🚨 Urgent Cases", 
+                urgent_count,
+                delta="Needs attention" if urgent_count > 0 else None,
+                delta_color="inverse" if urgent_count > 0 else "off"
             )
         
         with col2:
-            filter_status = st.selectbox(
-                "Filter by Status:",
-                ["All", "Pending", "Assigned", "In Progress", "Completed"]
-            )
+            st.metric("👥 Total in Queue", len(consultations))
         
         with col3:
-            filter_priority = st.selectbox(
-                "Filter by Priority:",
-                ["All", "URGENT", "MODERATE", "LOW"]
-            )
+            # ISO timestamps start with their date, so match the prefix
+            # instead of parsing every created_at
+            today = datetime.now().date().isoformat()
+            today_count = sum(1 for p in consultations 
+                             if (p.get('created_at') or '').startswith(today))
+            st.metric("📅 Today's Sessions", today_count)
         
-        # Apply filters
-        filtered_consultations = consultations.copy()
+        with col4:
+            avg_wait = "5-10 min" if urgent_count > 0 else "15-20 min"
+            st.metric("⏱️ Avg Response Time", avg_wait)
+        
+        st.markdown("---")
         
-        if filter_provider != "All":
-            if filter_provider == "Unassigned":
+        # ========================================================================
+        # FILTERS (Admin only)
+        # ========================================================================
+        if is_admin:
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                filter_provider = st.selectbox(
+                    "Filter by Provider Type:",
+                    ["All", "Doctor", "Pharmacist", "Unassigned"]
+                )
+            
+            with col2:
+                filter_status = st.selectbox(
+                    "Filter by Status:",
+                    ["All", "Pending", "Assigned", "In Progress", "Completed"]
+                )
+            
+            with col3:
+                filter_priority = st.selectbox(
+                    "Filter by Priority:",
+                    ["All", "URGENT", "MODERATE", "LOW"]
+                )
+            
+            # Apply filters
+            filtered_consultations = consultations.copy()
+            
+            if filter_provider != "All":
+                if filter_provider == "Unassigned":
+                    filtered_consultations = [c for c in filtered_consultations 
+                                             if not c.get('pharmacist_id') and not c.get('doctor_id')]
+                else:
+                    filtered_consultations = [c for c in filtered_consultations 
+                                             if c.get('provider_type', '').lower() == filter_provider.lower()]
+            
+            if filter_status != "All":
                 filtered_consultations = [c for c in filtered_consultations 
-                                         if not c.get('pharmacist_id') and not c.get('doctor_id')]
-            else:
+                                         if c.get('status', '').lower() == filter_status.lower()]
+            
+            if filter_priority != "All":
                 filtered_consultations = [c for c in filtered_consultations 
-                                         if c.get('provider_type', '').lower() == filter_provider.lower()]
-        
-        if filter_status != "All":
-            filtered_consultations = [c for c in filtered_consultations 
-                                     if c.get('status', '').lower() == filter_status.lower()]
+                                         if c.get('priority') == filter_priority]
+            
+            consultations = filtered_consultations
+            st.markdown("---")
         
-        if filter_priority != "All":
-            filtered_consultations = [c for c in filtered_consultations 
-                                     if c.get('priority') == filter_priority]
+        # ========================================================================
+        # DISPLAY CONSULTATIONS
+        # ========================================================================
         
-        consultations = filtered_consultations
-        st.markdown("---")
-    
-    # ========================================================================
-    # DISPLAY CONSULTATIONS
-    # ========================================================================
-    
-    if len(consultations) == 0:
-        st.info("✅ No patients in queue. System ready for new sessions.")
-    else:
-        for i, patient in enumerate(consultations):
-            # Determine priority styling
-            priority_icons = {
-                'URGENT': '🔴',
-                'MODERATE': '🟡',
-                'LOW': '🟢'
-            }
-            
-            priority_backgrounds = {
-                'URGENT': 'background-color: #ffebee;',
-                'MODERATE': 'background-color: #fff9e6;',
-                'LOW': 'background-color: #e8f5e9;'
-            }
-            
-            priority_borders = {
-                'URGENT': '#f44336',
-                'MODERATE': '#ff9800',
-                'LOW': '#4caf50'
-            }
+        if len(consultations) == 0:
+            st.info("✅ No patients in queue. System ready for new sessions.")
+        else:
+            # Triage order: one stable sort puts URGENT first while keeping the
+            # newest-first order from the query within each priority
+            consultations.sort(key=lambda c: _PRIORITY_RANK.get(c.get('priority'), 1))
+            
+            # Pagination: only one page of the queue is turned into a table and
+            # offered in the session picker. Clamp in case the queue shrank.
+            n_pages = (len(consultations) - 1) // _QUEUE_PAGE_SIZE + 1
+            queue_page = min(st.session_state.get('queue_page', 0), n_pages - 1)
+            st.session_state.queue_page = queue_page
+            start = queue_page * _QUEUE_PAGE_SIZE
+            visible = consultations[start:start + _QUEUE_PAGE_SIZE]
+            
+            # Queue overview: one table for the page instead of a card per patient
+            # Build only the shown columns rather than a full-width frame plus a sliced copy
+            queue_cols = [col for col in _QUEUE_COLUMNS if col in visible[0]]
+            df_queue = pd.DataFrame(visible, columns=queue_cols).rename(columns=_QUEUE_COLUMNS)
+            
+            if 'Received' in df_queue.columns:
+                df_queue['Received'] = pd.to_datetime(df_queue['Received'], format='ISO8601', errors='coerce').dt.strftime('%I:%M %p, %b %d')
+            
+            st.dataframe(df_queue.style.apply(_tint_rows, axis=None, column='Priority', colors=_PRIORITY_BG),
+                         use_container_width=True, hide_index=True)
+            
+            if n_pages > 1:
+                col_prev, col_page, col_next = st.columns([1, 2, 1])
+                with col_prev:
+                    st.button("⬅️ Prev", key="queue_prev", disabled=queue_page == 0,
+                              on_click=_set_queue_page, args=(queue_page - 1,))
+                with col_page:
+                    st.caption(f"Page {queue_page + 1} of {n_pages} · {len(consultations)} sessions")
+                with col_next:
+                    st.button("Next ➡️", key="queue_next", disabled=queue_page == n_pages - 1,
+                              on_click=_set_queue_page, args=(queue_page + 1,))
+            
+            # Action bar: work on one selected session at a time. The chosen
+            # consultation id is kept in session_state and passed back as the
+            # index, because the widget is recreated whenever the options change
+            queue = {c['id']: c for c in visible}
+            queue_ids = list(queue.keys())
+            open_id = st.session_state.get('queue_open_id')
+            selected_id = st.selectbox(
+                "🩺 Open session:",
+                options=queue_ids,
+                index=queue_ids.index(open_id) if open_id in queue else 0,
+                format_func=lambda x: f"{_PRIORITY_ICON.get(queue[x].get('priority'), '🟡')} {queue[x]['patient_name']}"
+            )
+            st.session_state.queue_open_id = selected_id
+            patient = queue[selected_id]
             
+            st.markdown("---")
+            
+            is_assigned = bool(patient.get('doctor_id') or patient.get('pharmacist_id'))
+            
+            # Determine priority styling
             priority = patient.get('priority', 'MODERATE')
-            icon = priority_icons.get(priority, '🟡')
-            bg = priority_backgrounds.get(priority, '')
-            border = priority_borders.get(priority, '#ff9800')
+            icon = _PRIORITY_ICON.get(priority, '🟡')
+            card_style = priority.lower() if priority in _PRIORITY_BORDER else 'moderate'
             
             # Get provider info
-            provider_type = patient.get('provider_type', 'unassigned')
-            provider_badge = ""
-            
-            if provider_type == 'doctor':
-                provider_badge = "<span class='provider-badge doctor-badge'>👨‍⚕️ DOCTOR</span>"
-            elif provider_type == 'pharmacist':
-                provider_badge = "<span class='provider-badge pharmacist-badge'>💊 PHARMACIST</span>"
-            else:
-                provider_badge = "<span class='provider-badge' style='background-color: #ffebee; color: #f44336;'>⚠️ UNASSIGNED</span>"
+            provider_badge = _PROVIDER_BADGE.get(patient.get('provider_type'), _UNASSIGNED_BADGE)
             
-            # Patient header
-            st.markdown(f"""
-                <div style='{bg} padding: 15px; border-radius: 10px; margin: 10px 0; 
-                            border-left: 5px solid {border};'>
-                    <h3>{icon} {priority} - {patient['patient_name']}</h3>
-                    {provider_badge}
-                </div>
-            """, unsafe_allow_html=True)
+            # Patient header: a native bordered container, tinted by the
+            # stylesheet rule matching its key
+            with st.container(border=True, key=f"card_{card_style}"):
+                st.subheader(f"{icon} {priority} - {patient['patient_name']}")
+                st.markdown(provider_badge)
             
             # Two-column layout
             col1, col2 = st.columns([1, 1])
             
             # LEFT: Patient Information
             with col1:
-                st.markdown("#### 📋 Patient Information")
-                st.write(f"**📞 Phone:** {patient.get('patient_phone', 'N/A')}")
-                st.write(f"**🩺 Symptoms:** {patient['symptoms']}")
-                st.write(f"**📊 Severity:** {patient.get('severity', 'N/A')}")
-                st.write(f"**⏰ Duration:** {patient.get('duration', 'N/A')}")
+                # Collect the details and send them as a single markdown block
+                info_lines = [
+                    "#### 📋 Patient Information",
+                    f"**📞 Phone:** {patient.get('patient_phone', 'N/A')}",
+                    f"**🩺 Symptoms:** {patient['symptoms']}",
+                    f"**📊 Severity:** {patient.get('severity', 'N/A')}",
+                    f"**⏰ Duration:** {patient.get('duration', 'N/A')}"
+                ]
                 
                 created_at = patient.get('created_at', '')
                 if created_at:
                     try:
                         dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        st.write(f"**🕐 Received:** {dt.strftime('%I:%M %p, %b %d')}")
+                        info_lines.append(f"**🕐 Received:** {dt.strftime('%I:%M %p, %b %d')}")
                     except:
-                        st.write(f"**🕐 Received:** {created_at[:16]}")
+                        info_lines.append(f"**🕐 Received:** {created_at[:16]}")
+                
+                st.markdown("\n\n".join(info_lines))
                 
                 if patient.get('detected_keywords'):
                     st.error(f"⚠️ **Alert Keywords:** {patient['detected_keywords']}")
                 
                 # Show assigned provider (admin view)
-                if user_role == "Admin (You)":
+                if is_admin:
                     if patient.get('doctor_id'):
                         doctors = get_doctors()
                         doctor = next((d for d in doctors if d['id'] == patient['doctor_id']), None)
@@ -515,15 +888,15 @@ if page == "📊 Live Queue":
             # ================================================================
             # ADMIN: ASSIGNMENT SECTION
             # ================================================================
-            if user_role == "Admin (You)" and not patient.get('doctor_id') and not patient.get('pharmacist_id'):
+            if is_admin and not is_assigned:
                 st.markdown("#### 🎯 Assign Healthcare Provider")
                 
                 col_assign1, col_assign2 = st.columns(2)
                 
                 with col_assign1:
-                    # Fetch available providers
-                    doctors = get_doctors()
-                    pharmacists = get_pharmacists()
+                    # Fetch available providers, uncached so online status is current
+                    doctors = get_doctors(live=True)
+                    pharmacists = get_pharmacists(live=True)
                     
                     online_doctors = [d for d in doctors if d.get('is_online', False)]
                     online_pharmacists = [p for p in pharmacists if p.get('is_online', False)]
@@ -557,16 +930,12 @@ if page == "📊 Live Queue":
                             )
                             
                             if st.button("✅ Assign to Doctor", key=f"assign_doctor_{patient['id']}", type="primary"):
-                                updates = {
-                                    'doctor_id': selected_doctor_id,
-                                    'provider_type': 'doctor',
-                                    'status': 'assigned',
-                                    'consultation_fee': 1500,
-                                    'started_at': datetime.now().isoformat()
-                                }
+                                updates = {**_DOCTOR_ASSIGNMENT,
+                                           'doctor_id': selected_doctor_id,
+                                           'started_at': datetime.now().isoformat()}
                                 update_consultation_status(patient['id'], updates)
                                 st.success("✅ Assigned to doctor!")
-                                st.rerun()
+                                _rerun_fragment()
                     
                     else:  # Pharmacist
                         if len(pharmacists) == 0:
@@ -583,147 +952,141 @@ if page == "📊 Live Queue":
                             )
                             
                             if st.button("✅ Assign to Pharmacist", key=f"assign_pharmacist_{patient['id']}", type="primary"):
-                                updates = {
-                                    'pharmacist_id': selected_pharmacist_id,
-                                    'provider_type': 'pharmacist',
-                                    'status': 'assigned',
-                                    'consultation_fee': 1000,
-                                    'started_at': datetime.now().isoformat()
-                                }
+                                updates = {**_PHARMACIST_ASSIGNMENT,
+                                           'pharmacist_id': selected_pharmacist_id,
+                                           'started_at': datetime.now().isoformat()}
                                 update_consultation_status(patient['id'], updates)
                                 st.success("✅ Assigned to pharmacist!")
-                                st.rerun()
+                                _rerun_fragment()
                 
                 st.markdown("---")
             
             # ================================================================
             # PROVIDER CLINICAL DECISION (for assigned cases)
             # ================================================================
-            if patient.get('doctor_id') or patient.get('pharmacist_id'):
+            if is_assigned:
                 st.markdown("#### 👨‍⚕️ Clinical Decision")
                 
-                col_a, col_b = st.columns(2)
-                
-                with col_a:
-                    # Diagnosis/Assessment
-                    if patient.get('provider_type') == 'doctor':
-                        diagnosis_label = "Medical Diagnosis:"
-                        diagnosis_help = "Professional medical diagnosis"
-                    else:
-                        diagnosis_label = "Symptom Assessment:"
-                        diagnosis_help = "Pharmacist's professional assessment (not diagnosis)"
+                # One form per open session: typing in the text areas doesn't
+                # rerun the fragment, and only the submitting button is sent
+                with st.form(f"decision_{patient['id']}"):
+                    col_a, col_b = st.columns(2)
                     
-                    clinical_assessment = st.text_area(
-                        diagnosis_label,
-                        value=patient.get('pharmacist_diagnosis', ''),  # field name is legacy
-                        key=f"assessment_{patient['id']}",
-                        placeholder="Your professional assessment",
-                        help=diagnosis_help
-                    )
-                    
-                    # Agreement level (if AI diagnosis exists)
-                    if patient.get('ai_diagnosis'):
-                        agreement = st.radio(
-                            "AI Assessment Evaluation:",
-                            options=['Agree with AI', 'Partially agree', 'Disagree with AI'],
-                            key=f"agreement_{patient['id']}",
-                            horizontal=True
-                        )
-                    else:
-                        agreement = None
-                
-                with col_b:
-                    # Prescription/Recommendations
-                    if patient.get('provider_type') == 'doctor':
-                        prescription_label = "Prescription:"
-                    else:
-                        prescription_label = "Medication Recommendations:"
-                    
-                    prescription = st.text_area(
-                        prescription_label,
-                        value=patient.get('pharmacist_prescription', ''),  # field name is legacy
-                        key=f"prescription_{patient['id']}",
-                        placeholder="Medications and dosages",
-                        height=150
-                    )
-                
-                # ============================================================
-                # ACTION BUTTONS
-                # ============================================================
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    if st.button("✅ Confirm & Complete", key=f"confirm_{patient['id']}", use_container_width=True):
-                        agreement_map = {
-                            'Agree with AI': 'agreed',
-                            'Partially agree': 'modified',
-                            'Disagree with AI': 'disagreed'
-                        }
+                    with col_a:
+                        # Diagnosis/Assessment
+                        if patient.get('provider_type') == 'doctor':
+                            diagnosis_label = "Medical Diagnosis:"
+                            diagnosis_help = "Professional medical diagnosis"
+                        else:
+                            diagnosis_label = "Symptom Assessment:"
+                            diagnosis_help = "Pharmacist's professional assessment (not diagnosis)"
                         
-                        updates = {
-                            'pharmacist_diagnosis': clinical_assessment,  # legacy field
-                            'pharmacist_prescription': prescription,  # legacy field
-                            'status': 'confirmed',
-                            'pharmacist_response': 'stock_available',
-                            'completed_at': datetime.now().isoformat(),
-                            'response_time': datetime.now().isoformat()
-                        }
+                        clinical_assessment = st.text_area(
+                            diagnosis_label,
+                            value=patient.get('pharmacist_diagnosis', ''),  # field name is legacy
+                            key=f"assessment_{patient['id']}",
+                            placeholder="Your professional assessment",
+                            help=diagnosis_help
+                        )
                         
-                        if agreement:
-                            updates['diagnosis_agreement'] = agreement_map[agreement]
+                        # Agreement level (if AI diagnosis exists)
+                        if patient.get('ai_diagnosis'):
+                            agreement = st.radio(
+                                "AI Assessment Evaluation:",
+                                options=['Agree with AI', 'Partially agree', 'Disagree with AI'],
+                                key=f"agreement_{patient['id']}",
+                                horizontal=True
+                            )
+                        else:
+                            agreement = None
+                    
+                    with col_b:
+                        # Prescription/Recommendations
+                        if patient.get('provider_type') == 'doctor':
+                            prescription_label = "Prescription:"
+                        else:
+                            prescription_label = "Medication Recommendations:"
                         
-                        update_consultation_status(patient['id'], updates)
-                        st.success(f"✅ Session completed for {patient['patient_name']}")
-                        st.rerun()
-                
-                with col2:
-                    if st.button("❌ Out of Stock", key=f"no_stock_{patient['id']}", use_container_width=True):
-                        updates = {
-                            'pharmacist_diagnosis': clinical_assessment,
-                            'status': 'referred',
-                            'pharmacist_response': 'out_of_stock',
-                            'response_time': datetime.now().isoformat()
-                        }
-                        update_consultation_status(patient['id'], updates)
-                        st.error("❌ Patient referred to alternative pharmacy")
-                        st.rerun()
-                
-                with col3:
-                    if patient.get('provider_type') == 'pharmacist':
-                        if st.button("🏥 Refer to Doctor", key=f"refer_{patient['id']}", use_container_width=True):
+                        prescription = st.text_area(
+                            prescription_label,
+                            value=patient.get('pharmacist_prescription', ''),  # field name is legacy
+                            key=f"prescription_{patient['id']}",
+                            placeholder="Medications and dosages",
+                            height=150
+                        )
+                    
+                    # ============================================================
+                    # ACTION BUTTONS
+                    # ============================================================
+                    col1, col2, col3, col4 = st.columns(4)
+                    
+                    with col1:
+                        if st.form_submit_button("✅ Confirm & Complete", use_container_width=True):
                             updates = {
-                                'pharmacist_diagnosis': clinical_assessment,
-                                'status': 'referred_to_doctor',
-                                'pharmacist_response': 'needs_doctor',
+                                'pharmacist_diagnosis': clinical_assessment,  # legacy field
+                                'pharmacist_prescription': prescription,  # legacy field
+                                'status': 'confirmed',
+                                'pharmacist_response': 'stock_available',
+                                'completed_at': datetime.now().isoformat(),
                                 'response_time': datetime.now().isoformat()
                             }
+                            
+                            if agreement:
+                                updates['diagnosis_agreement'] = _AGREEMENT_MAP[agreement]
+                            
                             update_consultation_status(patient['id'], updates)
-                            st.warning("🏥 Patient advised to see a doctor")
-                            st.rerun()
-                    else:
-                        if st.button("🏥 Refer to Hospital", key=f"refer_{patient['id']}", use_container_width=True):
+                            st.success(f"✅ Session completed for {patient['patient_name']}")
+                            _rerun_fragment()
+                    
+                    with col2:
+                        if st.form_submit_button("❌ Out of Stock", use_container_width=True):
                             updates = {
                                 'pharmacist_diagnosis': clinical_assessment,
-                                'status': 'referred_to_hospital',
+                                'status': 'referred',
+                                'pharmacist_response': 'out_of_stock',
                                 'response_time': datetime.now().isoformat()
                             }
                             update_consultation_status(patient['id'], updates)
-                            st.warning("🏥 Patient referred to hospital")
-                            st.rerun()
-                
-                with col4:
-                    if st.button("✔️ Mark Complete", key=f"done_{patient['id']}", use_container_width=True):
-                        updates = {
-                            'status': 'completed',
-                            'completed_at': datetime.now().isoformat(),
-                            'response_time': datetime.now().isoformat()
-                        }
-                        update_consultation_status(patient['id'], updates)
-                        st.success(f"✔️ Session completed for {patient['patient_name']}")
-                        st.rerun()
+                            st.error("❌ Patient referred to alternative pharmacy")
+                            _rerun_fragment()
+                    
+                    with col3:
+                        if patient.get('provider_type') == 'pharmacist':
+                            if st.form_submit_button("🏥 Refer to Doctor", use_container_width=True):
+                                updates = {
+                                    'pharmacist_diagnosis': clinical_assessment,
+                                    'status': 'referred_to_doctor',
+                                    'pharmacist_response': 'needs_doctor',
+                                    'response_time': datetime.now().isoformat()
+                                }
+                                update_consultation_status(patient['id'], updates)
+                                st.warning("🏥 Patient advised to see a doctor")
+                                _rerun_fragment()
+                        else:
+                            if st.form_submit_button("🏥 Refer to Hospital", use_container_width=True):
+                                updates = {
+                                    'pharmacist_diagnosis': clinical_assessment,
+                                    'status': 'referred_to_hospital',
+                                    'response_time': datetime.now().isoformat()
+                                }
+                                update_consultation_status(patient['id'], updates)
+                                st.warning("🏥 Patient referred to hospital")
+                                _rerun_fragment()
+                    
+                    with col4:
+                        if st.form_submit_button("✔️ Mark Complete", use_container_width=True):
+                            updates = {
+                                'status': 'completed',
+                                'completed_at': datetime.now().isoformat(),
+                                'response_time': datetime.now().isoformat()
+                            }
+                            update_consultation_status(patient['id'], updates)
+                            st.success(f"✔️ Session completed for {patient['patient_name']}")
+                            _rerun_fragment()
             
             st.markdown("---")
-            st.markdown("---")
+    
+    _live_queue()
 
 # ============================================================================
 # PAGE 2: DOCTORS MANAGEMENT (Admin only)
@@ -768,54 +1131,22 @@ elif page == "👨‍⚕️ Doctors":
         if len(doctors) == 0:
             st.info("No doctors in network yet. Add your first doctor in the 'Add New Doctor' tab.")
         else:
-            # Display as cards
-            for doctor in doctors:
-                status_color = '#e8f5e9' if doctor.get('is_online') else '#ffebee'
-                status_icon = '🟢' if doctor.get('is_online') else '🔴'
-                status_text = 'ONLINE' if doctor.get('is_online') else 'OFFLINE'
-                
-                st.markdown(f"""
-                    <div style='background-color: {status_color}; padding: 15px; border-radius: 10px; margin: 10px 0;'>
-                        <h4>{status_icon} Dr. {doctor['full_name']} - {status_text}</h4>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                col1, col2, col3, col4, col5 = st.columns(5)
-                
-                with col1:
-                    st.write(f"**📞 Phone:**")
-                    st.write(doctor.get('phone_number', 'N/A'))
-                
-                with col2:
-                    st.write(f"**📜 MDCN License:**")
-                    st.write(doctor.get('mdcn_license_number', 'N/A'))
-                    if doctor.get('license_verified'):
-                        st.success("✅ Verified")
-                    else:
-                        st.warning("⚠️ Pending")
-                
-                with col3:
-                    st.write(f"**💼 Specialization:**")
-                    st.write(doctor.get('specialization', 'General Practice'))
-                
-                with col4:
-                    st.write(f"**📊 Consultations:**")
-                    st.metric("", doctor.get('total_consultations', 0))
-                
-                with col5:
-                    st.write(f"**⭐ Rating:**")
-                    rating = doctor.get('rating', 0)
-                    st.metric("", f"{rating:.1f} ⭐")
-                
-                # Earnings info
-                col_earn1, col_earn2 = st.columns(2)
-                with col_earn1:
-                    st.write(f"**💰 Total Earnings:** ₦{doctor.get('total_earnings', 0):,.0f}")
-                with col_earn2:
-                    if st.button("💳 Process Payout", key=f"payout_doctor_{doctor['id']}"):
-                        st.info("Payout feature coming soon!")
-                
-                st.markdown("---")
+            # One roster table instead of a header, columns and two metrics per doctor
+            df_doctors = pd.DataFrame([_provider_row(d, 'mdcn_license_number') for d in doctors])
+            df_doctors.insert(4, 'Specialization', [d.get('specialization', 'General Practice') for d in doctors])
+            df_doctors = df_doctors.rename(columns={'License': 'MDCN License'})
+            st.dataframe(df_doctors.style.apply(_tint_rows, axis=None, column='Status', colors=_ONLINE_BG),
+                         use_container_width=True, hide_index=True)
+            
+            # Payout action for the selected doctor
+            doctor_names = {d['id']: f"Dr. {d['full_name']}" for d in doctors}
+            col_pick, col_pay = st.columns([3, 1])
+            with col_pick:
+                payout_doctor = st.selectbox("Doctor:", options=list(doctor_names.keys()),
+                                             format_func=lambda x: doctor_names[x], key="payout_doctor_pick")
+            with col_pay:
+                if st.button("💳 Process Payout", key="payout_doctor"):
+                    st.info(f"Payout for {doctor_names[payout_doctor]}: feature coming soon!")
     
     with tab2:
         st.subheader("Add New Doctor to Network")
@@ -927,48 +1258,21 @@ elif page == "💊 Pharmacists":
         if len(pharmacists) == 0:
             st.info("No pharmacists in network yet. Add your first pharmacist in the 'Add New Pharmacist' tab.")
         else:
-            for pharmacist in pharmacists:
-                status_color = '#e8f5e9' if pharmacist.get('is_online') else '#ffebee'
-                status_icon = '🟢' if pharmacist.get('is_online') else '🔴'
-                status_text = 'ONLINE' if pharmacist.get('is_online') else 'OFFLINE'
-                
-                st.markdown(f"""
-                    <div style='background-color: {status_color}; padding: 15px; border-radius: 10px; margin: 10px 0;'>
-                        <h4>{status_icon} Pharm. {pharmacist['full_name']} - {status_text}</h4>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.write(f"**📞 Phone:**")
-                    st.write(pharmacist.get('phone_number', 'N/A'))
-                
-                with col2:
-                    st.write(f"**📜 PCN License:**")
-                    st.write(pharmacist.get('pcn_license_number', 'N/A'))
-                    if pharmacist.get('license_verified'):
-                        st.success("✅ Verified")
-                    else:
-                        st.warning("⚠️ Pending")
-                
-                with col3:
-                    st.write(f"**📊 Sessions:**")
-                    st.metric("", pharmacist.get('total_consultations', 0))
-                
-                with col4:
-                    st.write(f"**⭐ Rating:**")
-                    rating = pharmacist.get('rating', 0)
-                    st.metric("", f"{rating:.1f} ⭐")
-                
-                col_earn1, col_earn2 = st.columns(2)
-                with col_earn1:
-                    st.write(f"**💰 Total Earnings:** ₦{pharmacist.get('total_earnings', 0):,.0f}")
-                with col_earn2:
-                    if st.button("💳 Process Payout", key=f"payout_pharm_{pharmacist['id']}"):
-                        st.info("Payout feature coming soon!")
-                
-                st.markdown("---")
+            # One roster table instead of a header, columns and two metrics per pharmacist
+            df_pharmacists = pd.DataFrame([_provider_row(p, 'pcn_license_number') for p in pharmacists])
+            df_pharmacists = df_pharmacists.rename(columns={'License': 'PCN License', 'Consultations': 'Sessions'})
+            st.dataframe(df_pharmacists.style.apply(_tint_rows, axis=None, column='Status', colors=_ONLINE_BG),
+                         use_container_width=True, hide_index=True)
+            
+            # Payout action for the selected pharmacist
+            pharmacist_names = {p['id']: f"Pharm. {p['full_name']}" for p in pharmacists}
+            col_pick, col_pay = st.columns([3, 1])
+            with col_pick:
+                payout_pharmacist = st.selectbox("Pharmacist:", options=list(pharmacist_names.keys()),
+                                                 format_func=lambda x: pharmacist_names[x], key="payout_pharm_pick")
+            with col_pay:
+                if st.button("💳 Process Payout", key="payout_pharm"):
+                    st.info(f"Payout for {pharmacist_names[payout_pharmacist]}: feature coming soon!")
     
     with tab2:
         st.subheader("Add New Pharmacist to Network")
@@ -1073,38 +1377,53 @@ elif page == "🏪 Pharmacies":
         if len(pharmacies) == 0:
             st.info("No partner pharmacies yet. Add your first pharmacy in the 'Add New Pharmacy' tab.")
         else:
+            # One markdown call for the whole list; these cards hold no widgets,
+            # so there is no need for a separate delta per row
+            cards_html = []
             for pharmacy in pharmacies:
-                status_color = '#e8f5e9' if pharmacy.get('status') == 'active' else '#ffebee'
-                status_icon = '✅' if pharmacy.get('status') == 'active' else '❌'
-                
-                st.markdown(f"""
-                    <div style='background-color: {status_color}; padding: 15px; border-radius: 10px; margin: 10px 0;'>
-                        <h4>{status_icon} {pharmacy['pharmacy_name']}</h4>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.write(f"**📍 Location:**")
-                    st.write(f"{pharmacy.get('city', 'N/A')}, {pharmacy.get('state', 'N/A')}")
-                    st.write(f"**📞 Phone:** {pharmacy.get('phone_number', 'N/A')}")
-                
-                with col2:
-                    st.write(f"**📦 Orders Fulfilled:** {pharmacy.get('total_orders_fulfilled', 0)}")
-                    st.write(f"**⭐ Rating:** {pharmacy.get('rating', 0):.1f}")
-                
-                with col3:
-                    st.write(f"**💰 Revenue:** ₦{pharmacy.get('total_revenue', 0):,.0f}")
-                    commission_rate = pharmacy.get('commission_rate', 0.15)
-                    st.write(f"**📊 Commission Rate:** {commission_rate*100:.0f}%")
-                
+                is_active = pharmacy.get('status') == 'active'
+                status_color = '#e8f5e9' if is_active else '#ffebee'
+                status_icon = '✅' if is_active else '❌'
+                commission_rate = pharmacy.get('commission_rate', 0.15)
                 if pharmacy.get('delivery_available'):
-                    st.success(f"🚚 Delivery available - Fee: ₦{pharmacy.get('delivery_fee', 0):,.0f}")
+                    delivery = f"🚚 Delivery available - Fee: ₦{pharmacy.get('delivery_fee', 0):,.0f}"
                 else:
-                    st.info("📦 Pickup only")
+                    delivery = "📦 Pickup only"
                 
-                st.markdown("---")
+                # Text fields come straight from the database; escape them
+                # before they go into raw HTML
+                name, city, state, phone, orders = (
+                    html.escape(str(value)) for value in (
+                        pharmacy['pharmacy_name'],
+                        pharmacy.get('city', 'N/A'),
+                        pharmacy.get('state', 'N/A'),
+                        pharmacy.get('phone_number', 'N/A'),
+                        pharmacy.get('total_orders_fulfilled', 0)
+                    )
+                )
+                
+                cards_html.append(f"""
+                    <div style='background-color: {status_color}; padding: 15px; border-radius: 10px; margin: 10px 0;'>
+                        <h4>{status_icon} {name}</h4>
+                        <div style='display: flex; gap: 20px;'>
+                            <div style='flex: 1;'>
+                                <b>📍 Location:</b><br>{city}, {state}<br>
+                                <b>📞 Phone:</b> {phone}
+                            </div>
+                            <div style='flex: 1;'>
+                                <b>📦 Orders Fulfilled:</b> {orders}<br>
+                                <b>⭐ Rating:</b> {pharmacy.get('rating', 0):.1f}
+                            </div>
+                            <div style='flex: 1;'>
+                                <b>💰 Revenue:</b> ₦{pharmacy.get('total_revenue', 0):,.0f}<br>
+                                <b>📊 Commission Rate:</b> {commission_rate*100:.0f}%
+                            </div>
+                        </div>
+                        <p style='margin: 10px 0 0 0;'>{delivery}</p>
+                    </div>
+                """)
+            
+            st.markdown("".join(cards_html), unsafe_allow_html=True)
     
     with tab2:
         st.subheader("Add New Partner Pharmacy")
@@ -1238,14 +1557,12 @@ elif page == "👥 Patients":
     if len(display_users) == 0:
         st.info("No patients found.")
     else:
-        # Display as table
-        df_users = pd.DataFrame(display_users)
-        
         # Select columns to display
         display_cols = ['name', 'phone_number', 'total_consultations', 'total_spent', 'created_at']
-        display_cols = [col for col in display_cols if col in df_users.columns]
+        display_cols = [col for col in display_cols if col in display_users[0]]
         
-        df_display = df_users[display_cols].copy()
+        # Display as table, building only the selected columns
+        df_display = pd.DataFrame(display_users, columns=display_cols)
         
         # Rename columns for display
         df_display.columns = ['Name', 'Phone', 'Sessions', 'Total Spent', 'Registered']
@@ -1273,6 +1590,8 @@ elif page == "👥 Patients":
 # PAGE 6: PAYMENTS (Admin only)
 # ============================================================================
 elif page == "💰 Payments":
+    import plotly.express as px
+    
     st.title("💰 Payments & Revenue Tracking")
     
     consultations = get_all_consultations()
@@ -1396,8 +1715,9 @@ elif page == "💰 Payments":
             df_consultations = pd.DataFrame(consultations)
             
             if 'created_at' in df_consultations.columns and 'platform_revenue' in df_consultations.columns:
-                df_consultations['date'] = pd.to_datetime(df_consultations['created_at']).dt.date
-                daily_revenue = df_consultations.groupby('date')['platform_revenue'].sum().reset_index()
+                daily_revenue = (df_consultations.set_index(pd.to_datetime(df_consultations['created_at'], format='ISO8601'))
+                                 ['platform_revenue'].resample('D').sum()
+                                 .rename_axis('date').reset_index())
                 
                 fig = px.line(daily_revenue, x='date', y='platform_revenue',
                              title='Daily Revenue Trend',
@@ -1408,311 +1728,319 @@ elif page == "💰 Payments":
 # PAGE 7: ANALYTICS (Available to all)
 # ============================================================================
 elif page == "📈 Analytics":
-    st.title("📈 Analytics & Insights")
-    
-    all_consultations = get_all_consultations()
-    
-    # Filter by user role
-    if user_role != "Admin (You)":
-        # Filter to show only this pharmacy's consultations
-        # In production, filter by pharmacy_id
-        pass
-    
-    if not all_consultations:
-        st.warning("No session data available yet. Data will appear once sessions are recorded.")
-        st.stop()
-    
-    df = pd.DataFrame(all_consultations)
-    
-    # ========================================================================
-    # KPI CARDS
-    # ========================================================================
-    col1, col2, col3, col4 = st.columns(4)
-    
-    total_consultations = len(df)
-    urgent_count = len(df[df['priority'] == 'URGENT']) if 'priority' in df.columns else 0
-    urgent_pct = (urgent_count / total_consultations * 100) if total_consultations > 0 else 0
-    
-    # Calculate average response time
-    df_with_response = df[df['response_time'].notna()] if 'response_time' in df.columns else pd.DataFrame()
-    
-    if len(df_with_response) > 0:
-        try:
-            df_with_response['created_dt'] = pd.to_datetime(df_with_response['created_at'])
-            df_with_response['response_dt'] = pd.to_datetime(df_with_response['response_time'])
-            df_with_response['response_mins'] = (df_with_response['response_dt'] - df_with_response['created_dt']).dt.total_seconds() / 60
-            avg_response = df_with_response['response_mins'].mean()
-        except:
-            avg_response = 0
-    else:
-        avg_response = 0
-    
-    with col1:
-        st.metric("Total Sessions", f"{total_consultations:,}")
-    
-    with col2:
-        st.metric("Urgent Cases", f"{urgent_pct:.1f}%", 
-                 delta=f"{urgent_count} cases")
-    
-    with col3:
-        st.metric("Avg Response Time", f"{int(avg_response)} min" if avg_response > 0 else "N/A")
-    
-    with col4:
-        completed = len(df[df['status'] == 'confirmed']) if 'status' in df.columns else 0
-        st.metric("Completed", completed, 
-                 delta=f"{(completed/total_consultations*100):.0f}%" if total_consultations > 0 else "0%")
-    
-    st.markdown("---")
-    
-    # ========================================================================
-    # CHARTS IN TABS
-    # ========================================================================
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "🎯 Severity Analysis", "👨‍⚕️ Provider Performance", "🤖 AI Performance"])
-    
-    with tab1:
-        st.subheader("Session Trends")
+    @st.fragment
+    def _analytics():
+        st.title("📈 Analytics & Insights")
         
-        if 'created_at' in df.columns:
-            df['date'] = pd.to_datetime(df['created_at']).dt.date
-            daily_counts = df.groupby('date').size().reset_index(name='count')
-            
-            fig = px.line(daily_counts, x='date', y='count',
-                         title='Daily Session Volume',
-                         labels={'date': 'Date', 'count': 'Sessions'})
-            fig.update_traces(line_color='#1f77b4', line_width=3)
-            st.plotly_chart(fig, use_container_width=True)
+        all_consultations = get_all_consultations()
         
-        # Status distribution
-        if 'status' in df.columns:
-            status_counts = df['status'].value_counts()
-            fig2 = px.pie(values=status_counts.values, names=status_counts.index,
-                         title='Session Status Distribution')
-            st.plotly_chart(fig2, use_container_width=True)
-    
-    with tab2:
-        st.subheader("Severity Distribution")
+        # Filter by user role
+        if not is_admin:
+            # Filter to show only this pharmacy's consultations
+            # In production, filter by pharmacy_id
+            pass
         
-        if 'priority' in df.columns:
-            priority_counts = df['priority'].value_counts()
-            
-            fig3 = px.pie(values=priority_counts.values, names=priority_counts.index,
-                         title='Priority Distribution',
-                         color_discrete_map={'URGENT':'#f44336', 'MODERATE':'#ff9800', 'LOW':'#4caf50'})
-            st.plotly_chart(fig3, use_container_width=True)
+        if not all_consultations:
+            st.warning("No session data available yet. Data will appear once sessions are recorded.")
+            return
         
-        if 'severity' in df.columns and df['severity'].notna().any():
-            severity_counts = df['severity'].value_counts()
-            fig4 = px.bar(x=severity_counts.index, y=severity_counts.values,
-                         title='Severity Levels',
-                         labels={'x': 'Severity', 'y': 'Count'},
-                         color=severity_counts.values,
-                         color_continuous_scale='Reds')
-            st.plotly_chart(fig4, use_container_width=True)
-    
-    with tab3:
-        st.subheader("Provider Performance")
-        
-        if 'provider_type' in df.columns and df['provider_type'].notna().any():
-            # Provider type distribution
-            provider_counts = df['provider_type'].value_counts()
-            
-            fig_provider = px.bar(x=provider_counts.index, y=provider_counts.values,
-                                 title='Sessions by Provider Type',
-                                 labels={'x': 'Provider Type', 'y': 'Count'},
-                                 color=provider_counts.index,
-                                 color_discrete_map={'doctor': '#1976d2', 'pharmacist': '#7b1fa2'})
-            st.plotly_chart(fig_provider, use_container_width=True)
-            
-            # Response time by provider type
-            if len(df_with_response) > 0 and 'provider_type' in df_with_response.columns:
-                avg_by_provider = df_with_response.groupby('provider_type')['response_mins'].mean().reset_index()
-                
-                fig_resp = px.bar(avg_by_provider, x='provider_type', y='response_mins',
-                                 title='Average Response Time by Provider Type',
-                                 labels={'provider_type': 'Provider Type', 'response_mins': 'Minutes'},
-                                 color='provider_type',
-                                 color_discrete_map={'doctor': '#1976d2', 'pharmacist': '#7b1fa2'})
-                st.plotly_chart(fig_resp, use_container_width=True)
+        df = pd.DataFrame(all_consultations)
+        
+        # ========================================================================
+        # KPI CARDS
+        # ========================================================================
+        col1, col2, col3, col4 = st.columns(4)
+        
+        total_consultations = len(df)
+        
+        # One value_counts pass per column feeds both the KPIs and the charts
+        priority_counts = df['priority'].value_counts() if 'priority' in df.columns else pd.Series(dtype='int64')
+        status_counts = df['status'].value_counts() if 'status' in df.columns else pd.Series(dtype='int64')
+        
+        urgent_count = int(priority_counts.get('URGENT', 0))
+        urgent_pct = (urgent_count / total_consultations * 100) if total_consultations > 0 else 0
+        
+        # Calculate average response time
+        df_with_response = df[df['response_time'].notna()] if 'response_time' in df.columns else pd.DataFrame()
+        
+        if len(df_with_response) > 0:
+            try:
+                # Parse each timestamp column once and attach only the derived
+                # minutes, instead of writing helper columns into a filtered copy
+                created_dt = _parse_utc(df_with_response['created_at'])
+                response_dt = _parse_utc(df_with_response['response_time'])
+                df_with_response = df_with_response.assign(
+                    response_mins=(response_dt - created_dt).dt.total_seconds() / 60
+                )
+                avg_response = df_with_response['response_mins'].mean()
+            except:
+                df_with_response = pd.DataFrame()
+                avg_response = 0
         else:
-            st.info("Provider performance data will appear once sessions are assigned to doctors/pharmacists.")
-    
-    with tab4:
-        st.subheader("🤖 AI Diagnostic Performance")
+            avg_response = 0
         
-        ai_consultations = df[df['ai_diagnosis'].notna() & df['pharmacist_diagnosis'].notna()] if 'ai_diagnosis' in df.columns and 'pharmacist_diagnosis' in df.columns else pd.DataFrame()
+        with col1:
+            st.metric("Total Sessions", f"{total_consultations:,}")
         
-        if len(ai_consultations) > 0:
-            col1, col2, col3 = st.columns(3)
+        with col2:
+            st.metric("Urgent Cases", f"{urgent_pct:.1f}%", 
+                     delta=f"{urgent_count} cases")
+        
+        with col3:
+            st.metric("Avg Response Time", f"{int(avg_response)} min" if avg_response > 0 else "N/A")
+        
+        with col4:
+            completed = int(status_counts.get('confirmed', 0))
+            st.metric("Completed", completed, 
+                     delta=f"{(completed/total_consultations*100):.0f}%" if total_consultations > 0 else "0%")
+        
+        st.markdown("---")
+        
+        # ========================================================================
+        # CHARTS IN TABS
+        # ========================================================================
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "🎯 Severity Analysis", "👨‍⚕️ Provider Performance", "🤖 AI Performance"])
+        
+        with tab1:
+            st.subheader("Session Trends")
             
-            total_reviewed = len(ai_consultations)
+            if 'created_at' in df.columns:
+                # Resample onto a continuous daily range so quiet days plot as 0
+                daily_counts = (pd.Series(1, index=pd.to_datetime(df['created_at'], format='ISO8601'))
+                                .resample('D').size()
+                                .rename_axis('date').reset_index(name='count'))
+                
+                st.plotly_chart(build_daily_sessions_fig(daily_counts), use_container_width=True)
             
-            if 'diagnosis_agreement' in ai_consultations.columns:
-                agreed = len(ai_consultations[ai_consultations['diagnosis_agreement'] == 'agreed'])
-                modified = len(ai_consultations[ai_consultations['diagnosis_agreement'] == 'modified'])
-                disagreed = len(ai_consultations[ai_consultations['diagnosis_agreement'] == 'disagreed'])
-            else:
-                agreed = modified = disagreed = 0
+            # Status distribution
+            if 'status' in df.columns:
+                st.plotly_chart(build_counts_pie_fig(status_counts, 'Session Status Distribution'),
+                               use_container_width=True)
+        
+        with tab2:
+            st.subheader("Severity Distribution")
             
-            with col1:
-                agreement_rate = (agreed / total_reviewed * 100) if total_reviewed > 0 else 0
-                st.metric("AI Agreement Rate", f"{agreement_rate:.1f}%", 
-                         delta=f"{agreed}/{total_reviewed}")
+            if 'priority' in df.columns:
+                st.plotly_chart(build_counts_pie_fig(priority_counts, 'Priority Distribution', _PRIORITY_BORDER),
+                               use_container_width=True)
             
-            with col2:
-                modification_rate = (modified / total_reviewed * 100) if total_reviewed > 0 else 0
-                st.metric("Modified Assessment", f"{modification_rate:.1f}%",
-                         delta=f"{modified}/{total_reviewed}")
+            if 'severity' in df.columns and df['severity'].notna().any():
+                severity_counts = df['severity'].value_counts()
+                st.plotly_chart(build_severity_fig(severity_counts), use_container_width=True)
+        
+        with tab3:
+            st.subheader("Provider Performance")
             
-            with col3:
-                disagreement_rate = (disagreed / total_reviewed * 100) if total_reviewed > 0 else 0
-                st.metric("AI Disagreement", f"{disagreement_rate:.1f}%",
-                         delta=f"{disagreed}/{total_reviewed}")
-            
-            if agreed + modified + disagreed > 0:
-                agreement_data = pd.DataFrame({
-                    'Category': ['Agreed', 'Modified', 'Disagreed'],
-                    'Count': [agreed, modified, disagreed]
-                })
+            if 'provider_type' in df.columns and df['provider_type'].notna().any():
+                # Provider type distribution
+                provider_counts = df['provider_type'].value_counts()
+                st.plotly_chart(build_provider_sessions_fig(provider_counts), use_container_width=True)
                 
-                fig5 = px.pie(agreement_data, values='Count', names='Category',
-                             title='Provider-AI Assessment Agreement',
-                             color='Category',
-                             color_discrete_map={'Agreed': '#4caf50', 'Modified': '#ff9800', 'Disagreed': '#f44336'})
-                st.plotly_chart(fig5, use_container_width=True)
-        else:
-            st.info("AI performance data will appear once sessions with AI assessments are completed.")
+                # Response time by provider type
+                if len(df_with_response) > 0 and 'provider_type' in df_with_response.columns:
+                    avg_by_provider = df_with_response.groupby('provider_type')['response_mins'].mean().reset_index()
+                    st.plotly_chart(build_provider_response_fig(avg_by_provider), use_container_width=True)
+            else:
+                st.info("Provider performance data will appear once sessions are assigned to doctors/pharmacists.")
+        
+        with tab4:
+            st.subheader("🤖 AI Diagnostic Performance")
+            
+            ai_consultations = df[df['ai_diagnosis'].notna() & df['pharmacist_diagnosis'].notna()] if 'ai_diagnosis' in df.columns and 'pharmacist_diagnosis' in df.columns else pd.DataFrame()
+            
+            if len(ai_consultations) > 0:
+                col1, col2, col3 = st.columns(3)
+                
+                total_reviewed = len(ai_consultations)
+                
+                if 'diagnosis_agreement' in ai_consultations.columns:
+                    agreement_counts = ai_consultations['diagnosis_agreement'].value_counts()
+                    agreed = int(agreement_counts.get('agreed', 0))
+                    modified = int(agreement_counts.get('modified', 0))
+                    disagreed = int(agreement_counts.get('disagreed', 0))
+                else:
+                    agreed = modified = disagreed = 0
+                
+                with col1:
+                    agreement_rate = (agreed / total_reviewed * 100) if total_reviewed > 0 else 0
+                    st.metric("AI Agreement Rate", f"{agreement_rate:.1f}%", 
+                             delta=f"{agreed}/{total_reviewed}")
+                
+                with col2:
+                    modification_rate = (modified / total_reviewed * 100) if total_reviewed > 0 else 0
+                    st.metric("Modified Assessment", f"{modification_rate:.1f}%",
+                             delta=f"{modified}/{total_reviewed}")
+                
+                with col3:
+                    disagreement_rate = (disagreed / total_reviewed * 100) if total_reviewed > 0 else 0
+                    st.metric("AI Disagreement", f"{disagreement_rate:.1f}%",
+                             delta=f"{disagreed}/{total_reviewed}")
+                
+                if agreed + modified + disagreed > 0:
+                    st.plotly_chart(build_agreement_fig(agreed, modified, disagreed), use_container_width=True)
+            else:
+                st.info("AI performance data will appear once sessions with AI assessments are completed.")
+    
+    _analytics()
 
 # ============================================================================
 # PAGE 8: INVENTORY (Available to all)
 # ============================================================================
 elif page == "📦 Inventory":
-    st.title("📦 Inventory Management")
-    
-    medications = get_inventory()
-    
-    if not medications:
-        st.warning("No inventory data available. Add medications in Supabase Table Editor.")
-        st.stop()
-    
-    df_inv = pd.DataFrame(medications)
-    
-    # ========================================================================
-    # SUMMARY METRICS
-    # ========================================================================
-    col1, col2, col3, col4 = st.columns(4)
-    
-    low_stock_count = len(df_inv[df_inv['status'] == 'Low Stock']) if 'status' in df_inv.columns else 0
-    
-    if 'current_stock' in df_inv.columns and 'unit_price' in df_inv.columns:
-        total_value = (df_inv['current_stock'] * df_inv['unit_price']).sum()
-    else:
-        total_value = 0
-    
-    with col1:
-        st.metric("⚠️ Low Stock Items", low_stock_count,
-                 delta="Needs reorder" if low_stock_count > 0 else None,
-                 delta_color="inverse" if low_stock_count > 0 else "off")
-    
-    with col2:
-        st.metric("📊 Total Items", len(df_inv))
-    
-    with col3:
-        st.metric("💰 Total Inventory Value", f"₦{total_value:,.0f}")
-    
-    with col4:
-        avg_turnover = df_inv['monthly_demand'].mean() if 'monthly_demand' in df_inv.columns else 0
-        st.metric("📈 Avg Monthly Demand", f"{int(avg_turnover)} units")
-    
-    st.markdown("---")
-    
-    # ========================================================================
-    # TABS
-    # ========================================================================
-    tab1, tab2 = st.tabs(["📋 Current Stock", "📊 Analytics"])
-    
-    with tab1:
-        st.subheader("Medication Inventory")
+    @st.fragment
+    def _inventory():
+        st.title("📦 Inventory Management")
+        
+        inv_version, medications = get_inventory_snapshot()
+        
+        if not medications:
+            st.warning("No inventory data available. Add medications in Supabase Table Editor.")
+            return
         
-        col1, col2 = st.columns([3, 1])
+        df_inv = pd.DataFrame(medications)
+        
+        # Unit counts fit in small ints; downcast to shrink the frame Streamlit serializes
+        for col in ('current_stock', 'reorder_point', 'monthly_demand'):
+            if col in df_inv.columns:
+                df_inv[col] = pd.to_numeric(df_inv[col], downcast='integer')
+        
+        has_levels = 'current_stock' in df_inv.columns and 'reorder_point' in df_inv.columns
+        
+        # The status stored in the medications table is authoritative. Only
+        # when the table has none is it derived, in one vectorized comparison
+        # stored as a two-category column, whose comparison doubles as the
+        # row masks. The Low Stock mask is shared by the status filter and the
+        # reorder list below.
+        status_masks = {}
+        if 'status' in df_inv.columns:
+            df_inv['status'] = df_inv['status'].astype('category')
+            status_masks = {value: (df_inv['status'] == value).to_numpy() for value in ('Low Stock', 'OK')}
+        elif has_levels:
+            low = df_inv['current_stock'].to_numpy() <= df_inv['reorder_point'].to_numpy()
+            df_inv['status'] = pd.Categorical.from_codes(low.astype(np.int8), categories=['OK', 'Low Stock'])
+            status_masks = {'Low Stock': low, 'OK': ~low}
+        
+        if has_levels:
+            # Stock as a multiple of the reorder point, drawn as an in-table bar
+            df_inv['stock_pct'] = (df_inv['current_stock'] / df_inv['reorder_point']).clip(upper=2.0)
+        
+        if 'current_stock' in df_inv.columns and 'unit_price' in df_inv.columns:
+            df_inv['total_value'] = df_inv['current_stock'] * df_inv['unit_price']
+        
+        # Names as a category: the lowercasing below then runs once per distinct
+        # name, and name lookups compare codes. Lowercased names are built once
+        # so searches are plain substring scans.
+        if 'medication_name' in df_inv.columns:
+            df_inv['medication_name'] = df_inv['medication_name'].astype('category')
+            df_inv['_med_lc'] = df_inv['medication_name'].str.lower().astype(object)
+        
+        # ========================================================================
+        # SUMMARY METRICS
+        # ========================================================================
+        col1, col2, col3, col4 = st.columns(4)
+        
+        summary = _inv_summary(df_inv, inv_version)
+        low_stock_count = summary['low']
         
         with col1:
-            search = st.text_input("🔍 Search medication", placeholder="Type medication name...")
+            st.metric("⚠️ Low Stock Items", low_stock_count,
+                     delta="Needs reorder" if low_stock_count > 0 else None,
+                     delta_color="inverse" if low_stock_count > 0 else "off")
         
         with col2:
-            filter_option = st.selectbox("Filter", ["All", "Low Stock", "OK"])
+            st.metric("📊 Total Items", len(df_inv))
         
-        df_display = df_inv.copy()
+        with col3:
+            st.metric("💰 Total Inventory Value", f"₦{summary['value']:,.0f}")
         
-        if search:
-            df_display = df_display[df_display['medication_name'].str.contains(search, case=False, na=False)]
+        with col4:
+            st.metric("📈 Avg Monthly Demand", f"{int(summary['avg'])} units")
         
-        if filter_option == "Low Stock":
-            df_display = df_display[df_display['status'] == 'Low Stock']
-        elif filter_option == "OK":
-            df_display = df_display[df_display['status'] == 'OK']
+        st.markdown("---")
         
-        for idx, row in df_display.iterrows():
-            status_color = '#ffebee' if row.get('status') == 'Low Stock' else '#e8f5e9'
-            status_icon = '⚠️' if row.get('status') == 'Low Stock' else '✅'
-            
-            st.markdown(f"""
-                <div style='background-color: {status_color}; padding: 15px; border-radius: 10px; margin: 10px 0;'>
-                    <h4>{status_icon} {row['medication_name']}</h4>
-                </div>
-            """, unsafe_allow_html=True)
+        # ========================================================================
+        # VIEWS
+        # ========================================================================
+        # A radio instead of st.tabs: tabs run every body on each rerun, so the
+        # charts would be built even while only the stock table is visible
+        view = st.radio(
+            "View",
+            ["📋 Current Stock", "📊 Analytics"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="inventory_view"
+        )
+        
+        if view == "📋 Current Stock":
+            st.subheader("Medication Inventory")
             
-            col1, col2, col3, col4 = st.columns(4)
+            col1, col2 = st.columns([3, 1])
             
             with col1:
-                st.metric("Current Stock", f"{row.get('current_stock', 0)} units")
+                search = st.text_input("🔍 Search medication", placeholder="Type medication name...",
+                                       key="inventory_search")
+                
+                # Single characters match almost everything; wait for a second one
+                if len(search) < 2:
+                    search = ""
+            
             with col2:
-                st.metric("Reorder Point", f"{row.get('reorder_point', 0)} units")
-            with col3:
-                st.metric("Monthly Demand", f"{row.get('monthly_demand', 0)} units")
-            with col4:
-                st.metric("Unit Price", f"₦{row.get('unit_price', 0)}")
+                filter_option = st.selectbox("Filter", ["All", "Low Stock", "OK"])
             
-            st.markdown("---")
-    
-    with tab2:
-        st.subheader("Inventory Analytics")
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            x=df_inv['medication_name'],
-            y=df_inv['current_stock'],
-            name='Current Stock',
-            marker_color='#1f77b4'
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=df_inv['medication_name'],
-            y=df_inv['reorder_point'],
-            name='Reorder Point',
-            line=dict(color='#f44336', dash='dash'),
-            mode='lines+markers'
-        ))
-        
-        fig.update_layout(
-            title='Stock Levels vs Reorder Points',
-            xaxis_title='Medication',
-            yaxis_title='Units',
-            height=400
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
-        
-        df_inv['total_value'] = df_inv['current_stock'] * df_inv['unit_price']
-        
-        fig2 = px.bar(df_inv.sort_values('total_value', ascending=False),
-                     x='medication_name', y='total_value',
-                     title='Inventory Value by Medication',
-                     labels={'total_value': 'Total Value (₦)', 'medication_name': 'Medication'},
-                     color='total_value',
-                     color_continuous_scale='Blues')
+            # Accumulate one row mask and index once; with no search and "All"
+            # the frame is shown as-is, without a copy
+            mask = status_masks.get(filter_option)
+            
+            if search:
+                search_mask = df_inv['_med_lc'].str.contains(search.lower(), regex=False, na=False).to_numpy()
+                mask = search_mask if mask is None else mask & search_mask
+            
+            df_display = df_inv if mask is None else df_inv[mask]
+            
+            # Whole filtered table in one grid, rows tinted by stock status
+            stock_cols = [col for col in _STOCK_COLUMNS if col in df_display.columns]
+            st.dataframe(
+                df_display[stock_cols].rename(columns=_STOCK_COLUMNS)
+                    .style.apply(_tint_rows, axis=None, column='Status', colors=_STOCK_BG),
+                column_config={
+                    'Stock vs Reorder': st.column_config.ProgressColumn(
+                        'Stock vs Reorder', format="%.1fx", min_value=0, max_value=2.0
+                    )
+                },
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            # Single reorder action for whichever low-stock item is selected
+            low_stock = df_inv[status_masks['Low Stock']] if status_masks else df_inv.iloc[0:0]
+            
+            if len(low_stock) > 0:
+                st.markdown("#### 📦 Reorder Low Stock")
+                
+                # A form so picking a medication doesn't rerun the page until submit
+                with st.form("reorder_form"):
+                    reorder_med = st.selectbox("Medication to reorder:", low_stock['medication_name'])
+                    submitted = st.form_submit_button("📦 Generate Reorder")
+                    
+                    if submitted:
+                        # itertuples yields a plain namedtuple instead of boxing the row into a Series
+                        row = next(low_stock[low_stock['medication_name'] == reorder_med].itertuples(index=False))
+                        # Missing columns and null cells both count as zero
+                        demand, stock = (getattr(row, col, 0) for col in ('monthly_demand', 'current_stock'))
+                        demand, stock = (0 if pd.isna(v) else int(v) for v in (demand, stock))
+                        reorder_qty = max(demand - stock, 0)
+                        st.success(f"✅ Reorder generated: {reorder_qty} units of {reorder_med}")
         
-        st.plotly_chart(fig2, use_container_width=True)
+        else:
+            st.subheader("Inventory Analytics")
+            
+            stock_levels = df_inv[['medication_name', 'current_stock', 'reorder_point']]
+            st.plotly_chart(build_stock_levels_fig(stock_levels, inv_version), use_container_width=True)
+            
+            st.plotly_chart(build_inventory_value_fig(df_inv[['medication_name', 'total_value']], inv_version),
+                           use_container_width=True)
+    
+    _inventory()
 
 # ============================================================================
 # PAGE 9: SETTINGS (Available to all)
@@ -1725,7 +2053,7 @@ elif page == "⚙️ Settings":
     with tab1:
         st.subheader("Business Information")
         
-        if user_role == "Admin (You)":
+        if is_admin:
             st.info("Configure your OgaDoctor marketplace settings")
             
             col1, col2 = st.columns(2)
@@ -1758,7 +2086,7 @@ elif page == "⚙️ Settings":
     with tab2:
         st.subheader("Pricing Configuration")
         
-        if user_role == "Admin (You)":
+        if is_admin:
             col1, col2 = st.columns(2)
             
             with col1:
@@ -1860,7 +2188,7 @@ elif page == "⚙️ Settings":
             consultations_count = len(get_all_consultations())
             medications_count = len(get_inventory())
             
-            if user_role == "Admin (You)":
+            if is_admin:
                 doctors_count = len(get_doctors())
                 pharmacists_count = len(get_pharmacists())
                 pharmacies_count = len(get_pharmacies())